@@ -1,41 +1,200 @@
+import atexit
+import logging
+import os
+import threading
 import requests
-import json
+import ijson
+import orjson
+import pandas as pd
 from datetime import datetime
 import re
-import time
-from pymongo import MongoClient, UpdateOne
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from pymongo import MongoClient, UpdateOne, IndexModel
+from pymongo.errors import CollectionInvalid
+from pymongo.write_concern import WriteConcern
 from config import Config
 
+log = logging.getLogger(__name__)
+
+# MongoDB target, resolved once at import
+_MONGO_URI = Config.MONGO_URI
+_MONGO_DB = Config.MONGO_DB
+_MONGO_COLL = Config.MONGO_COLLECTION
+
+# Stored documents use short keys to shrink BSON; readable name -> stored name
+_FIELD_MAP = {
+    'indicator': 'v',
+    'ioc_type': 'vt',
+    'malware': 'm',
+    'confidence_level': 'cl',
+    'etl_timestamp': 'ts',
+    'ioc_id': 'id',
+    'threat_type': 'tt',
+    'malware_alias': 'ma',
+    'reference': 'r',
+    'tags': 'tg',
+    'first_seen': 'fs',
+    'last_seen': 'ls'
+}
+
+# Read-only view exposing the readable field names
+_MONGO_VIEW = f"{_MONGO_COLL}_readable"
+_VIEW_PIPELINE = [
+    {'$project': {name: f"${short}" for name, short in _FIELD_MAP.items()}}
+]
+
+_INDEX_SPECS = (
+    IndexModel([('v', 1)], name='v_1', unique=True),
+    IndexModel([('vt', 1)], name='vt_1'),
+    IndexModel([('m', 1)], name='m_1')
+)
+
+# Delta-load state: the newest last_seen already loaded, kept in a meta collection
+_META_COLL = '_meta'
+_WATERMARK_ID = 'threatfox'
+
+# Marks that documents written under the long field names were renamed
+_SCHEMA_ID = 'schema'
+_SCHEMA_VERSION = 'short_keys'
+
+# Indexes on the former long field names, dropped on first use
+_LEGACY_INDEXES = ('indicator_1', 'ioc_type_1', 'malware_1')
+
+# Tuning knobs from ENV_TEMPLATE, read straight from the environment
+def _env_int(name, default):
+    """Read a positive integer environment variable, failing with a clear message"""
+    raw = os.getenv(name, '').strip()
+    if not raw:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer, got {raw!r}") from None
+    if value <= 0:
+        raise ValueError(f"{name} must be positive, got {value}")
+    return value
+
+_TRUE_VALUES = ('1', 'true', 'yes', 'on')
+_FALSE_VALUES = ('0', 'false', 'no', 'off')
+
+def _env_bool(name, default):
+    """Read a true/false environment variable, failing with a clear message"""
+    raw = os.getenv(name, '').strip().lower()
+    if not raw:
+        return default
+    if raw in _TRUE_VALUES:
+        return True
+    if raw in _FALSE_VALUES:
+        return False
+    raise ValueError(
+        f"{name} must be one of {', '.join(_TRUE_VALUES + _FALSE_VALUES)}, got {raw!r}"
+    )
+
+# Bulk load tuning; ThreatFox data is re-pullable, so unacknowledged-journal writes are acceptable
+BULK_BATCH_SIZE = _env_int('MONGO_BATCH_SIZE', 500)
+BULK_ORDERED = _env_bool('MONGO_ORDERED_WRITES', False)
+_INGEST_WRITE_CONCERN = WriteConcern(w=1, j=False)
+
+# Feed decoder: 'ijson' streams the body (low peak memory), 'orjson' decodes it in one fast pass
+FEED_PARSER = os.getenv('FEED_PARSER', '').strip().lower() or 'ijson'
+if FEED_PARSER not in ('ijson', 'orjson'):
+    raise ValueError(f"FEED_PARSER must be 'ijson' or 'orjson', got {FEED_PARSER!r}")
+
+# ThreatFox timestamp format, e.g. "2024-01-31 12:00:00"
+_DT_FMT = '%Y-%m-%d %H:%M:%S'
+
+# Fields every IOC must carry before it is accepted
+REQUIRED_FIELDS = ('ioc_value', 'ioc_type', 'malware')
+
+# Pre-compiled format checks, keyed by ThreatFox ioc_type; applied with fullmatch
+_IOC_VALIDATORS = {
+    'domain': re.compile(r'[A-Za-z0-9_.-]+\.(?:[A-Za-z]{2,}|xn--[A-Za-z0-9-]+)'),
+    'ip:port': re.compile(r'\d{1,3}(\.\d{1,3}){3}:\d+'),
+    'url': re.compile(r'https?://\S+', re.IGNORECASE),
+    'md5_hash': re.compile(r'[a-fA-F0-9]{32}'),
+    'sha1_hash': re.compile(r'[a-fA-F0-9]{40}'),
+    'sha256_hash': re.compile(r'[a-fA-F0-9]{64}'),
+}
+
+# ======================
+# HTTP SESSION
+# ======================
+
+def _build_session():
+    """Keep-alive session; retries back off exponentially and honour Retry-After"""
+    session = requests.Session()
+    retries = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        respect_retry_after_header=True
+    )
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=10, max_retries=retries))
+    session.headers.update({
+        "User-Agent": "ThreatFox-ETL-Connector/1.0",
+        "Accept": "application/json",
+        "Accept-Encoding": "gzip, deflate"
+    })
+    return session
+
+_SESSION = _build_session()
+
+# Prefer the C (yajl2) parser; fall back to whatever backend ijson picks
+try:
+    _ijson = ijson.get_backend('yajl2_c')
+except ImportError:
+    _ijson = ijson
+
 # ======================
 # VALIDATION FUNCTIONS
 # ======================
 
 def validate_response(response):
-    """Check API response for errors/empty data"""
+    """Check API response for errors/empty data, yielding (key, items) pairs"""
     if response.status_code != 200:
         raise ValueError(f"API returned {response.status_code}: {response.text}")
     
-    try:
-        data = response.json()
+    if FEED_PARSER == 'orjson':
+        try:
+            data = orjson.loads(response.content)
+        except orjson.JSONDecodeError:
+            raise ValueError("Invalid JSON response")
         if not data:
             raise ValueError("Empty API response")
-        return data
-    except json.JSONDecodeError:
+        yield from data.items()
+        return
+    
+    # Let urllib3 undo gzip/deflate before ijson reads the raw socket
+    response.raw.decode_content = True
+    empty = True
+    try:
+        for key, items in _ijson.kvitems(response.raw, '', use_float=True):
+            empty = False
+            yield key, items
+    except ijson.JSONError:
         raise ValueError("Invalid JSON response")
+    if empty:
+        raise ValueError("Empty API response")
 
 def validate_ioc(ioc):
     """Validate individual IOC fields"""
-    required_fields = ['ioc_value', 'ioc_type', 'malware']
-    for field in required_fields:
+    for field in REQUIRED_FIELDS:
         if field not in ioc:
             raise ValueError(f"Missing required field: {field} in IOC {ioc.get('id')}")
 
-    if not isinstance(ioc['ioc_value'], str) or not ioc['ioc_value'].strip():
-        raise ValueError(f"Invalid indicator value: {ioc['ioc_value']}")
+    value = ioc['ioc_value']
+    # Exact type check: decoded JSON never yields str subclasses
+    if type(value) is not str or not value.strip():
+        raise ValueError(f"Invalid indicator value: {value}")
 
-    # Additional validation rules
-    if ioc['ioc_type'] == 'domain' and '.' not in ioc['ioc_value']:
-        raise ValueError(f"Invalid domain format: {ioc['ioc_value']}")
+    # Type-specific format rules
+    validator = _IOC_VALIDATORS.get(ioc['ioc_type'])
+    if validator and not validator.fullmatch(value):
+        raise ValueError(f"Invalid {ioc['ioc_type']} format: {value}")
     if 'confidence_level' in ioc and not (0 <= ioc['confidence_level'] <= 100):
         raise ValueError(f"Invalid confidence level: {ioc['confidence_level']}")
 
@@ -43,131 +202,406 @@ def validate_ioc(ioc):
 # CORE ETL FUNCTIONS
 # ======================
 
+def _batched(iterable, size):
+    """Yield lists of up to `size` items from any iterable"""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+def iter_iocs(pairs):
+    """Flatten the feed's {id: [ioc, ...]} pairs into individual IOCs"""
+    for key, items in pairs:
+        if isinstance(items, list):
+            yield from items
+
+def extract_validated(iocs):
+    """Yield only IOCs that pass validate_ioc"""
+    for ioc in iocs:
+        try:
+            validate_ioc(ioc)
+            yield ioc
+        except ValueError as e:
+            log.warning("⚠️ Skipping invalid IOC: %s", e)
+
 def extract_data():
-    """Extract data from ThreatFox JSON feed with validation"""
+    """Extract data from ThreatFox JSON feed with validation, yielding IOCs lazily"""
     url = "https://threatfox.abuse.ch/export/json/recent/"
-    headers = {
-        "User-Agent": "ThreatFox-ETL-Connector/1.0",
-        "Accept": "application/json"
-    }
     
+    count = 0
     try:
-        # Rate limiting
-        time.sleep(2)
+        with _SESSION.get(url, timeout=30, stream=True) as response:
+            for ioc in extract_validated(iter_iocs(validate_response(response))):
+                count += 1
+                yield ioc
         
-        response = requests.get(url, headers=headers, timeout=30)
-        data = validate_response(response)
-        
-        iocs = []
-        for key, items in data.items():
-            if isinstance(items, list):
-                for ioc in items:
-                    try:
-                        validate_ioc(ioc)
-                        iocs.append(ioc)
-                    except ValueError as e:
-                        print(f"⚠️ Skipping invalid IOC: {str(e)}")
-                        continue
-        
-        print(f"✅ Extracted {len(iocs)} valid IOCs")
-        return iocs
+        log.info("✅ Extracted %d valid IOCs", count)
         
     except Exception as e:
-        print(f"❌ Extraction failed: {str(e)}")
-        return []
+        # Re-raise: ending the stream quietly would pass a partial feed off as complete
+        log.error("❌ Extraction failed: %s", e)
+        raise
 
-def parse_datetime(dt_str):
-    """Parse datetime string into datetime object"""
-    if not dt_str:
-        return None
-    try:
-        return datetime.strptime(dt_str, '%Y-%m-%d %H:%M:%S')
-    except ValueError:
-        print(f"⚠️ Could not parse timestamp: {dt_str}")
-        return None
+# Optional pass-through fields: (source key in feed, stored key in MongoDB)
+_OPTIONAL_FIELDS = (
+    ('id', _FIELD_MAP['ioc_id']),
+    ('threat_type', _FIELD_MAP['threat_type']),
+    ('malware_alias', _FIELD_MAP['malware_alias']),
+    ('reference', _FIELD_MAP['reference']),
+    ('tags', _FIELD_MAP['tags'])
+)
+
+def _to_datetimes(column):
+    """Vectorized timestamp parse; unparseable or missing values become None"""
+    parsed = pd.to_datetime(column, format=_DT_FMT, errors='coerce', cache=True)
+    for value in column[column.notna() & (column != '') & parsed.isna()]:
+        log.warning("⚠️ Could not parse timestamp: %s", value)
+    return [None if pd.isna(value) else value.to_pydatetime() for value in parsed]
+
+def _transform_batch(raw_data, etl_timestamp, watermark=None):
+    """Transform one batch of raw IOCs, vectorizing the timestamp and confidence columns.
 
-def transform_data(raw_data):
-    """Transform raw data for MongoDB with validation"""
-    transformed = []
-    for item in raw_data:
+    IOCs last seen (or, lacking that, first seen) at or before `watermark` are skipped.
+    """
+    frame = pd.DataFrame.from_records(
+        raw_data, columns=['first_seen_utc', 'last_seen_utc', 'confidence_level']
+    )
+    first_seen = _to_datetimes(frame['first_seen_utc'])
+    last_seen = _to_datetimes(frame['last_seen_utc'])
+    confidence = (
+        pd.to_numeric(frame['confidence_level'], errors='coerce')
+        .fillna(50).clip(0, 100).astype(int).tolist()
+    )
+    
+    for i, item in enumerate(raw_data):
+        seen = last_seen[i] or first_seen[i]
+        if watermark is not None and seen is not None and seen <= watermark:
+            continue
         try:
+            # Short keys, see _FIELD_MAP
             doc = {
-                'ioc_id': item.get('id'),
-                'indicator': item['ioc_value'],
-                'ioc_type': item['ioc_type'],
-                'threat_type': item.get('threat_type'),
-                'malware': item['malware'],
-                'malware_alias': item.get('malware_alias', []),
-                'first_seen': parse_datetime(item.get('first_seen_utc')),
-                'last_seen': parse_datetime(item.get('last_seen_utc')),
-                'confidence_level': min(max(item.get('confidence_level', 50), 0), 100),
-                'reference': item.get('reference', []),
-                'tags': item.get('tags', []),
-                'etl_timestamp': datetime.utcnow()
+                'v': item['ioc_value'],
+                'vt': item['ioc_type'],
+                'm': item['malware'],
+                'cl': confidence[i],
+                'ts': etl_timestamp
             }
-            # Clean empty values
-            transformed.append({k: v for k, v in doc.items() if v not in (None, [])})
+            # Only set keys with a value, instead of filtering a full dict afterwards
+            for src, dst in _OPTIONAL_FIELDS:
+                value = item.get(src)
+                if value is not None and value != []:
+                    doc[dst] = value
+            if first_seen[i] is not None:
+                doc['fs'] = first_seen[i]
+            if last_seen[i] is not None:
+                doc['ls'] = last_seen[i]
+            yield doc
         except Exception as e:
-            print(f"⚠️ Transformation failed for item {item.get('id')}: {str(e)}")
+            log.warning("⚠️ Transformation failed for item %s: %s", item.get('id'), e)
             continue
-    
-    return transformed
 
-def verify_mongodb_insert(collection, expected_count):
-    """Verify documents were inserted correctly"""
-    actual_count = collection.count_documents({})
+def verify_mongodb_insert(expected_count, upserted_count, matched_count):
+    """Verify every operation either inserted or matched a document"""
+    actual_count = upserted_count + matched_count
     if actual_count < expected_count:
         raise ValueError(f"Data loss! Expected {expected_count}, found {actual_count}")
-    print(f"✅ MongoDB verification: {actual_count} records")
+    log.info("✅ MongoDB verification: %d records", actual_count)
 
-def load_data(transformed_data):
-    """Load data into MongoDB with validation"""
-    if not transformed_data:
-        print("⚠️ No data to load")
-        return False
-    
+_client = None
+
+def _close_client():
+    if _client is not None:
+        _client.close()
+
+atexit.register(_close_client)
+
+def _get_collection():
+    """Return the target collection on a lazily created, process-wide MongoClient"""
+    global _client
+    if _client is None:
+        _client = MongoClient(_MONGO_URI, maxPoolSize=50, retryWrites=True)
+    db = _client[_MONGO_DB]
+    return db[_MONGO_COLL].with_options(write_concern=_INGEST_WRITE_CONCERN)
+
+_INDEXES_READY = False
+
+def _migrate_long_field_names(collection):
+    """Rename fields of documents stored before _FIELD_MAP, once per database.
+
+    Without this, each old document has no `v` and the unique v_1 index
+    rejects them all as duplicates of null.
+    """
+    meta = collection.database[_META_COLL]
+    if meta.find_one({'_id': _SCHEMA_ID, 'version': _SCHEMA_VERSION}):
+        return
+    result = collection.update_many(
+        {'indicator': {'$exists': True}},
+        {'$rename': dict(_FIELD_MAP)}
+    )
+    if result.modified_count:
+        log.info("✅ Renamed fields on %d existing documents", result.modified_count)
+    meta.update_one(
+        {'_id': _SCHEMA_ID},
+        {'$set': {'version': _SCHEMA_VERSION}},
+        upsert=True
+    )
+
+def _index_matches(info, spec):
+    """Whether an index_information() entry has the keys and options of an IndexModel spec"""
+    return (
+        list(info['key']) == list(spec['key'].items())
+        and info.get('unique', False) == spec.get('unique', False)
+        and info.get('partialFilterExpression') == spec.get('partialFilterExpression')
+    )
+
+def _ensure_indexes(collection):
+    """Create collection indexes and the readable view once per process"""
+    global _INDEXES_READY
+    if _INDEXES_READY:
+        return
+    _migrate_long_field_names(collection)
+    # Long-name indexes would treat every short-key document as a null duplicate
+    existing = collection.index_information()
+    for name in _LEGACY_INDEXES:
+        if name in existing:
+            collection.drop_index(name)
+    # A same-named index with other keys or options makes create_indexes fail
+    for model in _INDEX_SPECS:
+        spec = model.document
+        if spec['name'] in existing and not _index_matches(existing[spec['name']], spec):
+            collection.drop_index(spec['name'])
+    collection.create_indexes(list(_INDEX_SPECS))
     try:
-        client = MongoClient(Config.MONGO_URI)
-        db = client[Config.MONGO_DB]
-        collection = db[Config.MONGO_COLLECTION]
-        
-        # Get initial count
-        initial_count = collection.count_documents({})
+        collection.database.create_collection(
+            _MONGO_VIEW, viewOn=_MONGO_COLL, pipeline=_VIEW_PIPELINE
+        )
+    except CollectionInvalid:
+        pass  # view already exists
+    _INDEXES_READY = True
+
+def _seen_at(doc):
+    """When a document was last observed: last_seen, else first_seen, else None"""
+    return doc.get('ls') or doc.get('fs')
+
+def _is_newer(doc, current):
+    """Whether `doc` should replace `current` for the same indicator.
+
+    The newer observation wins; on a tie (or no timestamps) the later feed record does.
+    A record without timestamps never replaces one that has them.
+    """
+    seen, current_seen = _seen_at(doc), _seen_at(current)
+    if seen is None or current_seen is None:
+        return current_seen is None
+    return seen >= current_seen
+
+def _upsert_op(doc):
+    """Upsert `doc` unless the stored record for its indicator was seen more recently.
+
+    An update pipeline compares the stored last_seen/first_seen with the incoming
+    one server-side, so an older observation can never overwrite a newer one
+    (and thus never hides behind the watermark). Ties replace, as in _is_newer.
+    """
+    return UpdateOne(
+        {'v': doc['v']},
+        [{'$replaceWith': {'$cond': [
+            {'$gt': [{'$ifNull': ['$ls', '$fs']}, _seen_at(doc)]},
+            '$$ROOT',
+            {'$mergeObjects': ['$$ROOT', {'$literal': doc}]}
+        ]}}],
+        upsert=True
+    )
+
+def get_watermark(collection):
+    """Return the newest last_seen loaded by a previous run, or None"""
+    meta = collection.database[_META_COLL].find_one({'_id': _WATERMARK_ID})
+    return meta.get('watermark') if meta else None
+
+def save_watermark(collection, watermark):
+    """Persist the newest last_seen of a successful run"""
+    collection.database[_META_COLL].update_one(
+        {'_id': _WATERMARK_ID},
+        {'$set': {'watermark': watermark}},
+        upsert=True
+    )
+
+def load_data(transformed_data, watermark=None):
+    """Load data into MongoDB with validation, consuming documents batch by batch.
+
+    `watermark` is the value the documents were filtered against; it advances
+    to the newest last_seen written once the load verifies.
+    """
+    try:
+        collection = _get_collection()
         
-        # Create indexes if missing
-        indexes = {
-            'indicator_1': [('indicator', 1)],
-            'ioc_type_1': [('ioc_type', 1)],
-            'malware_1': [('malware', 1)]
-        }
+        # Create indexes on first use
+        _ensure_indexes(collection)
         
-        for name, fields in indexes.items():
-            if name not in collection.index_information():
-                collection.create_index(fields, name=name)
+        processed = upserted = modified = matched = 0
+        newest = watermark
+        for batch in _batched(transformed_data, BULK_BATCH_SIZE):
+            # Collapse duplicate indicators client-side; the most recently seen record wins
+            by_indicator = {}
+            for doc in batch:
+                current = by_indicator.get(doc['v'])
+                if current is None or _is_newer(doc, current):
+                    by_indicator[doc['v']] = doc
+                seen = _seen_at(doc)
+                if seen is not None and (newest is None or seen > newest):
+                    newest = seen
+            
+            # Bulk upsert, never replacing a more recently seen record
+            operations = [_upsert_op(doc) for doc in by_indicator.values()]
+            result = collection.bulk_write(
+                operations,
+                ordered=BULK_ORDERED,
+                bypass_document_validation=True
+            )
+            processed += len(operations)
+            upserted += result.upserted_count
+            modified += result.modified_count
+            matched += result.matched_count
         
-        # Bulk upsert
-        operations = [
-            UpdateOne(
-                {'indicator': doc['indicator']},
-                {'$set': doc},
-                upsert=True
-            ) for doc in transformed_data
-        ]
+        if not processed:
+            if watermark is not None:
+                log.info("✅ No IOCs newer than watermark %s", watermark)
+                return True
+            log.warning("⚠️ No data to load")
+            return False
         
-        result = collection.bulk_write(operations)
-        print(f"📊 Processed {len(operations)} records. "
-              f"Inserted: {result.upserted_count}, "
-              f"Updated: {result.modified_count}")
+        log.info("📊 Processed %d records. Inserted: %d, Updated: %d",
+                 processed, upserted, modified)
         
         # Verify insertion
-        verify_mongodb_insert(collection, initial_count + result.upserted_count)
+        verify_mongodb_insert(processed, upserted, matched)
+        
+        # Advance the delta watermark only after a verified load
+        if newest != watermark:
+            save_watermark(collection, newest)
         return True
         
+    except PipelineStageError:
+        raise  # not a load failure; the caller reports it
     except Exception as e:
-        print(f"❌ Loading failed: {str(e)}")
+        log.error("❌ Loading failed: %s", e)
         return False
+
+# ======================
+# CONCURRENT PIPELINE
+# ======================
+
+# Transform workers and the bound on in-flight batches between stages
+TRANSFORM_WORKERS = 2
+_QUEUE_DEPTH = 4
+
+class PipelineStageError(Exception):
+    """Extraction or transformation failed, so the feed was only partly processed"""
+
+def _acquire_slot(slots, stop):
+    """Wait for an in-flight batch slot; give up once the pipeline is stopping"""
+    while not slots.acquire(timeout=0.1):
+        if stop.is_set():
+            return False
+    return True
+
+def _extract_worker(raw_q, slots, stop):
+    """Push (sequence, batch) pairs of validated IOCs, then any extraction error, then one end marker per transformer"""
+    try:
+        for seq, batch in enumerate(_batched(extract_data(), BULK_BATCH_SIZE)):
+            if stop.is_set() or not _acquire_slot(slots, stop):
+                break
+            raw_q.put((seq, batch))
+    except Exception as e:
+        raw_q.put(e)
+    finally:
+        for _ in range(TRANSFORM_WORKERS):
+            raw_q.put(None)
+
+def _transform_worker(raw_q, trans_q, etl_timestamp, watermark):
+    """Turn (sequence, batch) pairs into (sequence, documents) pairs until the end marker arrives.
+
+    Errors are forwarded to the loader; after one, remaining batches are
+    consumed but discarded so the extractor never blocks.
+    """
+    failed = False
+    try:
+        while (item := raw_q.get()) is not None:
+            if isinstance(item, Exception):
+                trans_q.put(item)  # forward extraction errors to the loader
+                continue
+            if failed:
+                continue
+            seq, batch = item
+            try:
+                trans_q.put((seq, list(_transform_batch(batch, etl_timestamp, watermark))))
+            except Exception as e:
+                log.error("❌ Transformation failed for batch: %s", e)
+                trans_q.put(e)
+                failed = True
     finally:
-        client.close()
+        trans_q.put(None)
+
+def _drain(trans_q, slots, stop):
+    """Yield documents in feed order until every transformer has finished, then re-raise any stage error.
+
+    Workers finish batches out of order, so early arrivals are held until the
+    batches before them have been yielded; that keeps "newest record wins"
+    ties resolved by feed position. After an error no more documents are
+    yielded, but the queue is still emptied so that no worker stays blocked.
+    """
+    remaining = TRANSFORM_WORKERS
+    error = None
+    pending = {}
+    next_seq = 0
+    while remaining:
+        item = trans_q.get()
+        if item is None:
+            remaining -= 1
+        elif isinstance(item, Exception):
+            if error is None:
+                error = item
+                stop.set()
+        elif error is not None:
+            slots.release()
+        else:
+            seq, docs = item
+            pending[seq] = docs
+            while next_seq in pending:
+                docs = pending.pop(next_seq)
+                next_seq += 1
+                slots.release()
+                yield from docs
+    if error is not None:
+        raise PipelineStageError(str(error)) from error
+
+def run_pipeline():
+    """Run extract, transform and load concurrently, overlapping network IO, CPU and MongoDB IO"""
+    raw_q = Queue(maxsize=_QUEUE_DEPTH)
+    trans_q = Queue(maxsize=_QUEUE_DEPTH)
+    stop = threading.Event()
+    # Caps batches between extraction and loading, including ones held back for ordering
+    slots = threading.Semaphore(TRANSFORM_WORKERS + 2 * _QUEUE_DEPTH)
+    etl_timestamp = datetime.utcnow()  # one timestamp for the whole run
+    watermark = get_watermark(_get_collection())
+    
+    with ThreadPoolExecutor(max_workers=1 + TRANSFORM_WORKERS) as pool:
+        pool.submit(_extract_worker, raw_q, slots, stop)
+        for _ in range(TRANSFORM_WORKERS):
+            pool.submit(_transform_worker, raw_q, trans_q, etl_timestamp, watermark)
+        
+        docs = _drain(trans_q, slots, stop)
+        try:
+            # A stage error surfaces before the "nothing new" check and the watermark save
+            return load_data(docs, watermark)
+        except PipelineStageError as e:
+            log.error("❌ ETL aborted, feed incomplete (%s); watermark left at %s", e, watermark)
+            return False
+        finally:
+            # If loading stopped early, unblock the workers so the pool can shut down
+            stop.set()
+            try:
+                for _ in docs:
+                    pass
+            except Exception:
+                pass  # already failed; the stage error is not the one to report
 
 # ======================
 # MAIN EXECUTION
@@ -175,36 +609,28 @@ def load_data(transformed_data):
 
 def run_etl():
     """Orchestrate the ETL pipeline with validation"""
-    print("\n" + "="*50)
-    print("🚀 Starting ThreatFox ETL Pipeline")
-    print("="*50)
+    log.info("=" * 50)
+    log.info("🚀 Starting ThreatFox ETL Pipeline")
+    log.info("=" * 50)
     
     try:
-        # Extract
-        print("\n🔍 Extracting data...")
-        raw_data = extract_data()
-        if not raw_data:
-            return False
-        
-        # Transform
-        print("\n🔄 Transforming data...")
-        transformed_data = transform_data(raw_data)
-        if not transformed_data:
-            return False
-        
-        # Load
-        print("\n📂 Loading to MongoDB...")
-        success = load_data(transformed_data)
+        # Extract, transform and load run concurrently, linked by bounded queues
+        log.info("🔄 Streaming ThreatFox IOCs into MongoDB...")
+        success = run_pipeline()
         
         if success:
-            print("\n" + "="*50)
-            print("🎉 ETL completed successfully!")
-            print("="*50)
+            log.info("=" * 50)
+            log.info("🎉 ETL completed successfully!")
+            log.info("=" * 50)
         return success
         
     except Exception as e:
-        print(f"\n❌ Critical ETL failure: {str(e)}")
+        log.error("❌ Critical ETL failure: %s", e)
         return False
 
 if __name__ == "__main__":
+    logging.basicConfig(
+        level=os.getenv('LOG_LEVEL', '').strip().upper() or 'INFO',
+        format='%(asctime)s %(levelname)s %(message)s'
+    )
     run_etl()
\ No newline at end of file
@@ -0,0 +1,65 @@
+import threading
+import time
+import types
+
+import etl_connector
+
+
+class FakeCollection:
+    """In-memory stand-in for the MongoDB collection: stores documents in write order"""
+
+    def __init__(self):
+        self.stored = {}
+        self.database = {'_meta': types.SimpleNamespace(find_one=lambda query: None,
+                                                         update_one=lambda *a, **k: None)}
+
+    def bulk_write(self, operations, **kwargs):
+        for doc in operations:
+            self.stored[doc['v']] = doc
+        return types.SimpleNamespace(upserted_count=len(operations), modified_count=0,
+                                     matched_count=0)
+
+
+def test_pipeline_keeps_feed_order_when_first_batch_is_slow(monkeypatch):
+    # Six records, two per batch; the same indicator appears in each of the three batches
+    feed = [{'v': 'dup' if n % 2 else f'ioc-{n}', 'n': n} for n in range(6)]
+    collection = FakeCollection()
+    first_batch_done = threading.Event()
+
+    def slow_first_batch(batch, etl_timestamp, watermark):
+        if batch[0]['n'] == 0:
+            time.sleep(0.3)  # let the other worker finish later batches first
+            first_batch_done.set()
+        return (dict(doc) for doc in batch)
+
+    monkeypatch.setattr(etl_connector, 'BULK_BATCH_SIZE', 2)
+    monkeypatch.setattr(etl_connector, 'extract_data', lambda: iter(feed))
+    monkeypatch.setattr(etl_connector, '_transform_batch', slow_first_batch)
+    monkeypatch.setattr(etl_connector, '_get_collection', lambda: collection)
+    monkeypatch.setattr(etl_connector, '_ensure_indexes', lambda c: None)
+    monkeypatch.setattr(etl_connector, '_upsert_op', lambda doc: doc)
+
+    assert etl_connector.run_pipeline() is True
+    assert first_batch_done.is_set()
+    # No timestamps, so feed position decides: the last 'dup' record (n=5) must win
+    assert collection.stored['dup']['n'] == 5
+
+
+def test_load_keeps_most_recently_seen_record_and_watermark(monkeypatch):
+    from datetime import datetime
+    collection = FakeCollection()
+    saved = []
+    docs = [
+        {'v': 'a', 'ls': datetime(2024, 1, 3), 'n': 0},
+        {'v': 'a', 'ls': datetime(2024, 1, 1), 'n': 1},  # older, later in the feed
+        {'v': 'a', 'n': 2},  # no timestamps never replaces a dated record
+    ]
+
+    monkeypatch.setattr(etl_connector, '_ensure_indexes', lambda c: None)
+    monkeypatch.setattr(etl_connector, '_get_collection', lambda: collection)
+    monkeypatch.setattr(etl_connector, '_upsert_op', lambda doc: doc)
+    monkeypatch.setattr(etl_connector, 'save_watermark', lambda c, w: saved.append(w))
+
+    assert etl_connector.load_data(iter(docs)) is True
+    assert collection.stored['a']['n'] == 0
+    assert saved == [datetime(2024, 1, 3)]